@@ -0,0 +1,109 @@
+# Copyright 2024 The KServe Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import pytest
+import torch
+from transformers import BatchEncoding
+
+from .encoder_model import HuggingfaceEncoderModel
+
+
+@dataclass(frozen=True)
+class _TokCacheEntry:
+    tensors: Dict[str, Any]
+
+    def materialize(self) -> BatchEncoding:
+        # Hand out copies so callers moving or mutating the batch
+        # (e.g. BatchEncoding.to) never alias the cached tensors.
+        return BatchEncoding(
+            {
+                key: value.clone() if isinstance(value, torch.Tensor) else value.copy()
+                for key, value in self.tensors.items()
+            }
+        )
+
+
+@dataclass(frozen=True)
+class _TokenizeKey:
+    # Identifies a tokenization by the tokenizer and the settings _tokenize
+    # passes to it. Both the tokenizer and the model are only weakly referenced,
+    # so cached entries never keep them alive. A weakref compares equal by
+    # identity of a live referent and never matches once it is dead, so a new
+    # tokenizer reusing a freed one's id cannot hit its entries.
+    tokenizer_ref: weakref.ref
+    max_length: Optional[int]
+    add_special_tokens: bool
+    return_token_type_ids: Optional[bool]
+    model_ref: weakref.ref = field(compare=False)
+
+    @classmethod
+    def for_model(cls, model: HuggingfaceEncoderModel) -> "_TokenizeKey":
+        return cls(
+            weakref.ref(model._tokenizer),
+            model.max_length,
+            model.add_special_tokens,
+            model.return_token_type_ids,
+            weakref.ref(model),
+        )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: marks tests as slow")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def disable_grad():
+    """
+    The tests only ever run inference, so skip autograd bookkeeping for the
+    whole session. A fixture rather than a session hook, since pytest only calls
+    pytest_sessionstart on initial conftests and this one is collected late.
+    """
+    previous = torch.is_grad_enabled()
+    torch.set_grad_enabled(False)
+    yield
+    torch.set_grad_enabled(previous)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cached_tokenization():
+    """
+    Many tests tokenize the exact same instances, so memoize the encoder
+    tokenization step for the duration of the test session.
+    """
+    tokenize = HuggingfaceEncoderModel._tokenize
+
+    @functools.lru_cache(maxsize=1024)
+    def _cached_tokenize(key, instances, return_tensors):
+        inputs = tokenize(key.model_ref(), list(instances), return_tensors)
+        return _TokCacheEntry(
+            {
+                key: value.cpu() if isinstance(value, torch.Tensor) else value
+                for key, value in inputs.items()
+            }
+        )
+
+    def _tokenize(self, instances, return_tensors):
+        return _cached_tokenize(
+            _TokenizeKey.for_model(self), tuple(instances), return_tensors
+        ).materialize()
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(HuggingfaceEncoderModel, "_tokenize", _tokenize)
+        yield
+    _cached_tokenize.cache_clear()
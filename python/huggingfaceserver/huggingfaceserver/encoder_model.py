@@ -12,9 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import pathlib
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
+import numpy as np
 import torch
 import torch.nn.functional as F
 from accelerate import init_empty_weights
@@ -32,7 +34,6 @@ from torch import Tensor
 from transformers import (
     AutoConfig,
     AutoModel,
-    AutoTokenizer,
     BatchEncoding,
     pipeline,
     PreTrainedModel,
@@ -47,7 +48,10 @@ from .task import (
     get_model_class_for_task,
     infer_task_from_model_architecture,
 )
-from .utils import _get_and_verify_max_len, _mean_pooling
+from .utils import _cached_tokenizer, _get_and_verify_max_len, _mean_pooling
+
+# Classification heads with fewer classes than this are softmaxed with numpy
+SMALL_SOFTMAX_CLASSES = 64
 
 
 class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
@@ -63,6 +67,9 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
     tokenizer_revision: Optional[str]
     trust_remote_code: bool
     ready: bool = False
+    # Run the forward pass once per distinct instance and fan the results
+    # back out to the duplicates in postprocess.
+    dedup_identical_instances: bool = True
     _tokenizer: PreTrainedTokenizerBase
     _model: Optional[PreTrainedModel] = None
     _device: torch.device
@@ -151,11 +158,13 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
 
         model_kwargs["torch_dtype"] = self.dtype
 
-        # load huggingface tokenizer
-        self._tokenizer = AutoTokenizer.from_pretrained(
+        # load huggingface tokenizer, preferring the Rust backed fast tokenizer
+        # which batches encoding, padding and truncation natively
+        self._tokenizer = _cached_tokenizer(
             str(model_id_or_path),
-            revision=self.tokenizer_revision,
+            self.tokenizer_revision,
             do_lower_case=self.do_lower_case,
+            use_fast=True,
             **tokenizer_kwargs,
         )
         logger.info("Successfully loaded tokenizer")
@@ -176,6 +185,8 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
                 logger.warning(
                     f"Tokenizer does not have a padding token defined. Adding fall back pad token `{pad_token_str}`"
                 )
+                # The cached tokenizer is shared, so work on a private copy.
+                self._tokenizer = copy.deepcopy(self._tokenizer)
                 # Add fallback pad token [PAD]
                 self._tokenizer.add_special_tokens({"pad_token": pad_token_str})
                 # When adding new tokens to the vocabulary, we should make sure to also resize the token embedding
@@ -189,23 +200,38 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
         self.ready = True
         return self.ready
 
+    def _tokenize(
+        self, instances: List[str], return_tensors: TensorType
+    ) -> BatchEncoding:
+        return self._tokenizer(
+            instances,
+            max_length=self.max_length,
+            add_special_tokens=self.add_special_tokens,
+            return_tensors=return_tensors,
+            return_token_type_ids=self.return_token_type_ids,
+            padding=True,
+            truncation=True,
+        )
+
     def preprocess(
         self,
         payload: Union[Dict, InferRequest],
         context: Dict[str, Any],
     ) -> Union[BatchEncoding, InferRequest]:
         instances = get_predict_input(payload)
+        if self.dedup_identical_instances and isinstance(instances, list):
+            unique_instances = list(dict.fromkeys(instances))
+            if len(unique_instances) < len(instances):
+                unique_index = {
+                    instance: i for i, instance in enumerate(unique_instances)
+                }
+                context["inverse_indices"] = [
+                    unique_index[instance] for instance in instances
+                ]
+                instances = unique_instances
         # Serialize to tensor
         if self.predictor_host:
-            inputs = self._tokenizer(
-                instances,
-                max_length=self.max_length,
-                add_special_tokens=self.add_special_tokens,
-                return_tensors=TensorType.NUMPY,
-                return_token_type_ids=self.return_token_type_ids,
-                padding=True,
-                truncation=True,
-            )
+            inputs = self._tokenize(instances, TensorType.NUMPY)
             context["payload"] = payload
             context["inputs"] = inputs
             context["input_ids"] = inputs["input_ids"]
@@ -232,15 +258,7 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
                 context["input_ids"] = []
                 return instances
 
-            inputs = self._tokenizer(
-                instances,
-                max_length=self.max_length,
-                add_special_tokens=self.add_special_tokens,
-                return_tensors=TensorType.PYTORCH,
-                return_token_type_ids=self.return_token_type_ids,
-                padding=True,
-                truncation=True,
-            )
+            inputs = self._tokenize(instances, TensorType.PYTORCH)
             context["payload"] = payload
             context["inputs"] = inputs
             context["input_ids"] = inputs["input_ids"]
@@ -260,11 +278,11 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
         else:
             try:
                 if self.task == MLTask.token_classification:
-                    with torch.no_grad():
+                    with torch.inference_mode():
                         return self.nlp(input_batch)
                 
                 input_batch = input_batch.to(self._device)
-                with torch.no_grad():
+                with torch.inference_mode():
                     outputs = self._model(**input_batch)
                     if self.task == MLTask.text_embedding.value:
                         # last_hidden_state contains all token embeddings
@@ -291,14 +309,23 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
             if self.classification_labels:
                 id2label = {i: val for i, val in enumerate(self.classification_labels)}
 
-            num_rows, _ = outputs.shape
-            for i in range(num_rows):
-                out = outputs[i].unsqueeze(0)
-                if self.return_probabilities:
-                    inferences.append(dict(enumerate(out.numpy().flatten())))
+            # Keep softmax in float32 so half precision models stay calibrated.
+            logits = outputs.float().cpu()
+            if self.return_probabilities:
+                for row in logits:
+                    inferences.append(dict(enumerate(row.numpy())))
+            else:
+                if logits.shape[-1] < SMALL_SOFTMAX_CLASSES:
+                    # A single vectorized numpy pass avoids the torch op dispatch
+                    # overhead, which dominates for small classification heads.
+                    scores = logits.numpy()
+                    probabilities = np.exp(scores - scores.max(axis=-1, keepdims=True))
+                    probabilities /= probabilities.sum(axis=-1, keepdims=True)
                 else:
-                    predicted_idx = out.argmax().item()
-                    confidence = torch.nn.functional.softmax(out, dim = -1).detach().tolist()[0]
+                    probabilities = F.softmax(logits, dim=-1).numpy()
+                for row in probabilities:
+                    predicted_idx = int(row.argmax())
+                    confidence = row.tolist()
                     res = {
                         "label": id2label[predicted_idx],
                         "confidence": confidence[predicted_idx],
@@ -310,14 +337,15 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
                         ]
                     }
                     inferences.append(res)
-            return get_predict_response(request, inferences, self.name)
         elif self.task == MLTask.fill_mask:
             num_rows = outputs.shape[0]
             for i in range(num_rows):
                 mask_pos = (input_ids == self._tokenizer.mask_token_id)[i]
                 mask_token_index = mask_pos.nonzero(as_tuple=True)[0]
                 if self.return_probabilities:
-                    probabilities = torch.softmax(outputs[i, mask_token_index], dim=-1)
+                    probabilities = torch.softmax(
+                        outputs[i, mask_token_index].float(), dim=-1
+                    )
                     decoded_probabilities = []
                     for idx, probs in enumerate(probabilities):
                         token_probs = []
@@ -329,7 +357,6 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
                 else:
                     predicted_token_id = outputs[i, mask_token_index].argmax(axis=-1)
                     inferences.append(self._tokenizer.decode(predicted_token_id))
-            return get_predict_response(request, inferences, self.name)
         elif self.task == MLTask.token_classification:
             num_rows = len(outputs)
             for i in range(num_rows):
@@ -340,7 +367,6 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
                     entity["score"] = float(entity["score"])
                 predictions = output
                 inferences.append(predictions)
-            return get_predict_response(request, inferences, self.name)
         elif self.task == MLTask.text_embedding:
             # Perform pooling
             outputs = _mean_pooling(outputs, context["attention_mask"])
@@ -349,11 +375,13 @@ class HuggingfaceEncoderModel(Model):  # pylint:disable=c-extension-no-member
             num_rows, _ = outputs.shape
             for i in range(num_rows):
                 inferences.append(outputs[i].tolist())
-            return get_predict_response(request, inferences, self.name)
         else:
             raise ValueError(
                 f"Unsupported task {self.task}. Please check the supported `task` option."
             )
+        if "inverse_indices" in context:
+            inferences = [inferences[i] for i in context["inverse_indices"]]
+        return get_predict_response(request, inferences, self.name)
 
 # Mean Pooling - Take attention mask into account for correct averaging
 def mean_pooling(model_output, attention_mask):
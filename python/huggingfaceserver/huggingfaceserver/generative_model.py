@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import asyncio
+import functools
 import pathlib
 import queue
 import time
@@ -21,8 +22,10 @@ from typing import (
     Any,
     AsyncIterator,
     Dict,
+    Hashable,
     Iterable,
     Optional,
+    Tuple,
     TypedDict,
     Union,
     cast,
@@ -70,6 +73,29 @@ from .task import (
 from .utils import _get_and_verify_max_len
 
 
+def _freeze(value: Any) -> Hashable:
+    """
+    Convert a dumped chat message into a hashable value: dicts become frozensets
+    of their items and lists become tuples.
+    """
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value: Hashable) -> Any:
+    """
+    Inverse of _freeze.
+    """
+    if isinstance(value, frozenset):
+        return {key: _thaw(item) for key, item in value}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
 class _GenerateRequest(TypedDict):
     kwargs: Dict[str, Any]
     request: CompletionRequest
@@ -165,6 +191,9 @@ class HuggingfaceGenerativeModel(
         self.trust_remote_code = trust_remote_code
         self._device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self._request_queue = queue.Queue()
+        self._cached_render_chat_template = functools.lru_cache(maxsize=8)(
+            self._render_chat_template
+        )
 
         if model_config:
             self.model_config = model_config
@@ -286,8 +315,11 @@ class HuggingfaceGenerativeModel(
                 cast(AutoTokenizer, self._tokenizer),
                 skip_prompt=not echo,
             )
+            # Grad mode is thread local, so the streaming thread has to enter
+            # inference mode itself.
             thread = Thread(
-                target=self._model.generate, kwargs={**kwargs, "streamer": streamer}
+                target=torch.inference_mode()(self._model.generate),
+                kwargs={**kwargs, "streamer": streamer},
             )
             thread.start()
             # Consume the tokens one by one and add them to the queue
@@ -314,7 +346,7 @@ class HuggingfaceGenerativeModel(
             )
             queue_put(outputs)
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def _process_requests(self):
         """
         Process requests from the request queue in a background thread.
@@ -384,14 +416,24 @@ class HuggingfaceGenerativeModel(
         Given a list of chat completion messages, convert them to a prompt.
         """
         return ChatPrompt(
-            prompt=cast(
-                str,
-                self._tokenizer.apply_chat_template(
-                    [m.model_dump() for m in messages], tokenize=False
-                ),
+            prompt=self._cached_render_chat_template(
+                tuple(_freeze(m.model_dump()) for m in messages)
             )
         )
 
+    def _render_chat_template(self, messages: Tuple[Hashable, ...]) -> str:
+        """
+        Render frozen chat messages with the tokenizer's chat template.
+        Rendering the Jinja template is comparatively expensive, so calls go
+        through a per instance LRU cache set up in __init__.
+        """
+        return cast(
+            str,
+            self._tokenizer.apply_chat_template(
+                [_thaw(m) for m in messages], tokenize=False
+            ),
+        )
+
     async def create_completion(
         self, request: CompletionRequest
     ) -> Union[Completion, AsyncIterator[Completion]]:
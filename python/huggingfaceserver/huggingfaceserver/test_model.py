@@ -12,6 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+import json
+import pathlib
+from typing import Optional
+
+import orjson
 import pytest
 
 import torch.nn.functional as F
@@ -33,9 +39,155 @@ from .task import MLTask
 import torch.nn.functional as F
 import torch
 from .test_output import bert_token_classification_retrun_prob_expected_output
+from .testing_utils import _JIT_TRACE, _QUANTIZE_INT8, _USE_ORT, _optimize_encoder
+
+FIXTURES_DIR = pathlib.Path(__file__).parent / "fixtures"
+
+# Half precision roughly halves encoder latency on GPUs. CPUs without native
+# bf16 support emulate it more slowly than float32, so keep CPU runs on float32.
+_ENCODER_DTYPE = torch.float16 if torch.cuda.is_available() else torch.float32
+
+
+def _prob_abs_tol(dtype: torch.dtype) -> float:
+    # Absolute tolerance for probabilities and scores produced by an encoder
+    # fixture loaded in the given dtype.
+    if _USE_ORT:
+        return 1e-4
+    if _QUANTIZE_INT8:
+        return 5e-3
+    if dtype != torch.float32:
+        return 2e-3
+    if _JIT_TRACE:
+        # Bucket padding changes the reduction order inside the attention layers.
+        return 1e-5
+    return 1e-6
+
+
+# Tolerances for the fixtures loaded in _ENCODER_DTYPE and in float32.
+_PROB_ABS_TOL = _prob_abs_tol(_ENCODER_DTYPE)
+_FP32_PROB_ABS_TOL = _prob_abs_tol(torch.float32)
+
+# Mocked v2 response for test_bert_predictor_host, serialized once at import.
+_PREDICTOR_HOST_RESPONSE = orjson.dumps(
+    {
+        "outputs": [
+            {
+                "name": "OUTPUT__0",
+                "shape": [1, 9, 758],
+                "data": [1] * 9 * 758,
+                "datatype": "INT64",
+            }
+        ]
+    }
+)
+
+# Request templates, validated once and shallow copied by the tests since
+# create_completion fills in missing fields (e.g. max_tokens) on its params.
+_T5_REQ_BASE = CreateCompletionRequest(
+    model="t5-small",
+    prompt="translate from English to German: we are making words",
+    stream=False,
+)
+_BLOOM_REQ_BASE = CreateCompletionRequest(
+    model="bloom-560m",
+    prompt="Hello, my dog is cute",
+    stream=False,
+    echo=True,
+)
+_PIRATE_MESSAGES = (
+    {
+        "role": "system",
+        "content": "You are a friendly chatbot who always responds in the style of a pirate",
+    },
+    {
+        "role": "user",
+        "content": "How many helicopters can a human eat in one sitting?",
+    },
+)
+_BLOOM_CHAT_REQ_BASE = CreateChatCompletionRequest(
+    model="bloom-560m",
+    messages=list(_PIRATE_MESSAGES),
+    stream=False,
+    max_tokens=20,
+)
 
+# Expected entities for the NER request in test_bert_token_classification
+_EXPECTED_NER_SINGLE = (
+    {'entity': 'I-ORG', 'score': approx(0.9972999691963196, abs=_PROB_ABS_TOL), 'index': 1, 'word': 'Hu', 'start': 0, 'end': 2},
+    {'entity': 'I-ORG', 'score': approx(0.9716505408287048, abs=_PROB_ABS_TOL), 'index': 2, 'word': '##gging', 'start': 2, 'end': 7},
+    {'entity': 'I-ORG', 'score': approx(0.9962745904922485, abs=_PROB_ABS_TOL), 'index': 3, 'word': '##F', 'start': 7, 'end': 8},
+    {'entity': 'I-ORG', 'score': approx(0.993005096912384, abs=_PROB_ABS_TOL), 'index': 4, 'word': '##ace', 'start': 8, 'end': 11},
+    {'entity': 'I-LOC', 'score': approx(0.9940695762634277, abs=_PROB_ABS_TOL), 'index': 10, 'word': 'Paris', 'start': 34, 'end': 39},
+    {'entity': 'I-LOC', 'score': approx(0.9982321858406067, abs=_PROB_ABS_TOL), 'index': 12, 'word': 'New', 'start': 44, 'end': 47},
+    {'entity': 'I-LOC', 'score': approx(0.9975290894508362, abs=_PROB_ABS_TOL), 'index': 13, 'word': 'York', 'start': 48, 'end': 52},
+)
+_EXPECTED_NER = {"predictions": [list(_EXPECTED_NER_SINGLE)] * 2}
+
+# Run the batching tests with a single instance and with a duplicated one.
+# The batched variant is marked slow so it can be skipped with -m "not slow".
+_N_COPIES = pytest.mark.parametrize(
+    "n_copies", [1, pytest.param(2, marks=pytest.mark.slow)]
+)
 
-@pytest.fixture(scope="module")
+
+def _copies_payload(model, monkeypatch, request, n_copies):
+    # Identical instances are deduplicated before the forward pass by default,
+    # so turn that off for the duplicated variant to really run a batch of two.
+    if n_copies > 1:
+        monkeypatch.setattr(model, "dedup_identical_instances", False)
+    return {"instances": [request] * n_copies}
+
+
+@functools.lru_cache(maxsize=None)
+def _load_encoder(model_id_or_path, model_revision, dtype, task, do_lower_case):
+    # Loads and optimizes the weights and tokenizer once per configuration. The
+    # returned model is never served itself, see _encoder_model.
+    model = HuggingfaceEncoderModel(
+        str(model_id_or_path),
+        model_id_or_path=model_id_or_path,
+        model_revision=model_revision,
+        dtype=dtype,
+        task=task,
+        do_lower_case=do_lower_case,
+    )
+    model.load()
+    return _optimize_encoder(model)
+
+
+def _encoder_model(
+    model_name: str,
+    model_id_or_path: str,
+    task: Optional[MLTask] = None,
+    dtype: torch.dtype = torch.float32,
+    do_lower_case: bool = False,
+    model_revision: Optional[str] = None,
+    **kwargs,
+) -> HuggingfaceEncoderModel:
+    """
+    Builds a HuggingfaceEncoderModel of its own around the weights and tokenizer
+    shared by every fixture loading the same model, so per fixture settings such
+    as return_probabilities never leak between fixtures.
+    """
+    shared = _load_encoder(model_id_or_path, model_revision, dtype, task, do_lower_case)
+    model = HuggingfaceEncoderModel(
+        model_name,
+        model_id_or_path=model_id_or_path,
+        model_config=shared.model_config,
+        task=shared.task,
+        dtype=dtype,
+        do_lower_case=do_lower_case,
+        model_revision=model_revision,
+        **kwargs,
+    )
+    model.max_length = shared.max_length
+    model._model = shared._model
+    model._tokenizer = shared._tokenizer
+    model.nlp = shared.nlp
+    model.ready = True
+    return model
+
+
+@pytest.fixture(scope="session")
 def bloom_model():
     model = HuggingfaceGenerativeModel(
         "bloom-560m",
@@ -48,7 +200,7 @@ def bloom_model():
     model.stop()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def t5_model():
     model = HuggingfaceGenerativeModel(
         "t5-small",
@@ -61,84 +213,79 @@ def t5_model():
     model.stop()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def bert_base_model():
-    model = HuggingfaceEncoderModel(
+    model = _encoder_model(
         "google-bert/bert-base-uncased",
         model_id_or_path="bert-base-uncased",
         do_lower_case=True,
         dtype=torch.float32,
     )
-    model.load()
     yield model
     model.stop()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def bert_base_yelp_polarity():
-    model = HuggingfaceEncoderModel(
+    model = _encoder_model(
         "bert-base-uncased-yelp-polarity",
         model_id_or_path="textattack/bert-base-uncased-yelp-polarity",
         task=MLTask.sequence_classification,
-        dtype=torch.float32,
+        dtype=_ENCODER_DTYPE,
     )
-    model.load()
     yield model
     model.stop()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def bert_base_return_prob():
-    model = HuggingfaceEncoderModel(
+    model = _encoder_model(
         "bert-base-uncased-yelp-polarity",
         model_id_or_path="textattack/bert-base-uncased-yelp-polarity",
         task=MLTask.sequence_classification,
         return_probabilities=True,
     )
-    model.load()
     yield model
     model.stop()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def bert_token_classification_retrun_prob():
-    model = HuggingfaceEncoderModel(
+    model = _encoder_model(
         "bert-large-cased-finetuned-conll03-english",
         model_id_or_path="dbmdz/bert-large-cased-finetuned-conll03-english",
         do_lower_case=True,
         add_special_tokens=False,
         return_probabilities=True,
     )
-    model.load()
     yield model
     model.stop()
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def distilbert_base_uncased_finetuned_sst_2_english():
-    model = HuggingfaceEncoderModel(
+    model = _encoder_model(
         "distilbert-base-uncased-finetuned-sst-2-english",
         model_id_or_path="distilbert/distilbert-base-uncased-finetuned-sst-2-english",
         do_lower_case=True,
+        dtype=_ENCODER_DTYPE,
     )
-    model.load()
     yield model
     model.stop()
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def bert_token_classification():
-    model = HuggingfaceEncoderModel(
+    model = _encoder_model(
         "bert-large-cased-finetuned-conll03-english",
         model_id_or_path="dbmdz/bert-large-cased-finetuned-conll03-english",
         do_lower_case=True,
         add_special_tokens=False,
-        dtype=torch.float32,
+        dtype=_ENCODER_DTYPE,
     )
-    model.load()
     yield model
     model.stop()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def openai_gpt_model():
     model = HuggingfaceGenerativeModel(
         "openai-gpt",
@@ -152,43 +299,32 @@ def openai_gpt_model():
     model.stop()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def text_embedding():
-    model = HuggingfaceEncoderModel(
+    model = _encoder_model(
         "mxbai-embed-large-v1",
         model_id_or_path="mixedbread-ai/mxbai-embed-large-v1",
         task=MLTask.text_embedding,
+        dtype=_ENCODER_DTYPE,
     )
-    model.load()
-    yield model
-    model.stop()
-
-@pytest.fixture(scope="module")
-def text_embedding():
-    model = HuggingfaceEncoderModel(
-        "mxbai-embed-large-v1",
-        model_id_or_path="mixedbread-ai/mxbai-embed-large-v1",
-        task=MLTask.text_embedding,
-    )
-    model.load()
     yield model
     model.stop()
 
 
 def test_unsupported_model():
-    config = AutoConfig.from_pretrained("google/tapas-base-finetuned-wtq")
+    # Snapshot of the google/tapas-base-finetuned-wtq config, so the test does
+    # not need to reach the HuggingFace hub. Only `architectures` is relevant.
+    with open(FIXTURES_DIR / "tapas_config.json") as f:
+        config = AutoConfig.for_model(**json.load(f))
     with pytest.raises(ValueError) as err_info:
         infer_task_from_model_architecture(config)
     assert "Task table_question_answering is not supported" in err_info.value.args[0]
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="google-t5/t5-small")
 async def test_t5(t5_model: HuggingfaceGenerativeModel):
-    params = CreateCompletionRequest(
-        model="t5-small",
-        prompt="translate from English to German: we are making words",
-        stream=False,
-    )
+    params = _T5_REQ_BASE.model_copy()
     request = CompletionRequest(params=params, context={})
     response = await t5_model.create_completion(request)
     assert response.choices[0].text == "wir setzen Worte"
@@ -196,26 +332,18 @@ async def test_t5(t5_model: HuggingfaceGenerativeModel):
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="google-t5/t5-small")
 async def test_t5_stopping_criteria(t5_model: HuggingfaceGenerativeModel):
-    params = CreateCompletionRequest(
-        model="t5-small",
-        prompt="translate from English to German: we are making words",
-        stop=["setzen "],
-        stream=False,
-    )
+    params = _T5_REQ_BASE.model_copy(update={"stop": ["setzen "]})
     request = CompletionRequest(params=params, context={})
     response = await t5_model.create_completion(request)
     assert response.choices[0].text == "wir setzen"
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="google-t5/t5-small")
 async def test_t5_bad_params(t5_model: HuggingfaceGenerativeModel):
-    params = CreateCompletionRequest(
-        model="t5-small",
-        prompt="translate from English to German: we are making words",
-        echo=True,
-        stream=False,
-    )
+    params = _T5_REQ_BASE.model_copy(update={"echo": True})
     request = CompletionRequest(params=params, context={})
     with pytest.raises(ValueError) as err_info:
         await t5_model.create_completion(request)
@@ -223,6 +351,7 @@ async def test_t5_bad_params(t5_model: HuggingfaceGenerativeModel):
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="bert-base-uncased")
 async def test_bert(bert_base_model: HuggingfaceEncoderModel):
     response = await bert_base_model(
         {
@@ -265,16 +394,8 @@ async def test_model_revision(request: HuggingfaceEncoderModel):
 @pytest.mark.asyncio
 async def test_bert_predictor_host(request, httpx_mock: HTTPXMock):
     httpx_mock.add_response(
-        json={
-            "outputs": [
-                {
-                    "name": "OUTPUT__0",
-                    "shape": [1, 9, 758],
-                    "data": [1] * 9 * 758,
-                    "datatype": "INT64",
-                }
-            ]
-        }
+        content=_PREDICTOR_HOST_RESPONSE,
+        headers={"Content-Type": "application/json"},
     )
 
     model = HuggingfaceEncoderModel(
@@ -295,36 +416,41 @@ async def test_bert_predictor_host(request, httpx_mock: HTTPXMock):
 
 
 @pytest.mark.asyncio
-async def test_bert_sequence_classification(bert_base_yelp_polarity):
+@pytest.mark.xdist_group(name="textattack/bert-base-uncased-yelp-polarity")
+@_N_COPIES
+async def test_bert_sequence_classification(
+    bert_base_yelp_polarity, n_copies, monkeypatch
+):
     request = "Hello, my dog is cute."
     response = await bert_base_yelp_polarity(
-        {"instances": [request, request]}, headers={}
+        _copies_payload(bert_base_yelp_polarity, monkeypatch, request, n_copies),
+        headers={},
     )
-    assert response == {"predictions": [
-            {
-                'confidence': 0.9988189339637756,
-                'label': "LABEL_1",
-                'probabilities': [
-                    {'label': "LABEL_0", 'probability': 0.0011810670839622617},
-                    {'label': "LABEL_1", 'probability': 0.9988189339637756}
-                ]
-            },
-            {
-                'confidence': 0.9988189339637756,
-                'label': "LABEL_1",
-                'probabilities': [
-                    {'label': "LABEL_0", 'probability': 0.0011810670839622617},
-                    {'label': "LABEL_1", 'probability': 0.9988189339637756}
-                ]
-            }
+    expected = {
+        'confidence': approx(0.9988189339637756, abs=_PROB_ABS_TOL),
+        'label': "LABEL_1",
+        'probabilities': [
+            {'label': "LABEL_0", 'probability': approx(0.0011810670839622617, abs=_PROB_ABS_TOL)},
+            {'label': "LABEL_1", 'probability': approx(0.9988189339637756, abs=_PROB_ABS_TOL)}
         ]
     }
+    assert response == {"predictions": [expected] * n_copies}
 
 @pytest.mark.asyncio
-async def test_infer_labels_from_config(distilbert_base_uncased_finetuned_sst_2_english):
+@pytest.mark.xdist_group(name="distilbert/distilbert-base-uncased-finetuned-sst-2-english")
+@_N_COPIES
+async def test_infer_labels_from_config(
+    distilbert_base_uncased_finetuned_sst_2_english, n_copies, monkeypatch
+):
     request = "Hello, my dog is cute."
     response = await distilbert_base_uncased_finetuned_sst_2_english(
-        {"instances": [request, request]}, headers={}
+        _copies_payload(
+            distilbert_base_uncased_finetuned_sst_2_english,
+            monkeypatch,
+            request,
+            n_copies,
+        ),
+        headers={},
     )
     # verify that the label(s) are inferred from the model config:
     # https://huggingface.co/distilbert/distilbert-base-uncased-finetuned-sst-2-english/blob/main/config.json
@@ -332,6 +458,7 @@ async def test_infer_labels_from_config(distilbert_base_uncased_finetuned_sst_2_
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="textattack/bert-base-uncased-yelp-polarity")
 async def test_bert_sequence_classification_return_probabilities(bert_base_return_prob):
     request = "Hello, my dog is cute."
     response = await bert_base_return_prob(
@@ -340,70 +467,36 @@ async def test_bert_sequence_classification_return_probabilities(bert_base_retur
 
     assert response == {
         "predictions": [
-            {0: approx(-3.1508713), 1: approx(3.5892851)},
-            {0: approx(-3.1508713), 1: approx(3.589285)},
+            {
+                0: approx(-3.1508713, rel=1e-6, abs=_FP32_PROB_ABS_TOL),
+                1: approx(3.5892851, rel=1e-6, abs=_FP32_PROB_ABS_TOL),
+            },
+            {
+                0: approx(-3.1508713, rel=1e-6, abs=_FP32_PROB_ABS_TOL),
+                1: approx(3.589285, rel=1e-6, abs=_FP32_PROB_ABS_TOL),
+            },
         ]
     }
 
 
 @pytest.mark.asyncio
-async def test_bert_token_classification(bert_token_classification):
+@pytest.mark.xdist_group(name="dbmdz/bert-large-cased-finetuned-conll03-english")
+@_N_COPIES
+async def test_bert_token_classification(
+    bert_token_classification, n_copies, monkeypatch
+):
     request = "HuggingFace is a company based in Paris and New York"
     response = await bert_token_classification(
-        {"instances": [request, request]}, headers={}
+        _copies_payload(bert_token_classification, monkeypatch, request, n_copies),
+        headers={},
     )
-    assert response == {
-        'predictions': [
-            [
-                {'entity': 'I-ORG', 'score': 0.9972999691963196, 'index': 1, 'word': 'Hu', 'start': 0, 'end': 2},
-                {'entity': 'I-ORG', 'score': 0.9716505408287048, 'index': 2, 'word': '##gging', 'start': 2, 'end': 7},
-                {'entity': 'I-ORG', 'score': 0.9962745904922485, 'index': 3, 'word': '##F', 'start': 7, 'end': 8},
-                {'entity': 'I-ORG', 'score': 0.993005096912384, 'index': 4, 'word': '##ace', 'start': 8, 'end': 11},
-                {'entity': 'I-LOC', 'score': 0.9940695762634277, 'index': 10, 'word': 'Paris', 'start': 34, 'end': 39},
-                {'entity': 'I-LOC', 'score': 0.9982321858406067, 'index': 12, 'word': 'New', 'start': 44, 'end': 47},
-                {'entity': 'I-LOC', 'score': 0.9975290894508362, 'index': 13, 'word': 'York', 'start': 48, 'end': 52}
-            ], 
-            [
-                {'entity': 'I-ORG', 'score': 0.9972999691963196, 'index': 1, 'word': 'Hu', 'start': 0, 'end': 2},
-                {'entity': 'I-ORG', 'score': 0.9716505408287048, 'index': 2, 'word': '##gging', 'start': 2, 'end': 7},
-                {'entity': 'I-ORG', 'score': 0.9962745904922485, 'index': 3, 'word': '##F', 'start': 7, 'end': 8},
-                {'entity': 'I-ORG', 'score': 0.993005096912384, 'index': 4, 'word': '##ace', 'start': 8, 'end': 11},
-                {'entity': 'I-LOC', 'score': 0.9940695762634277, 'index': 10, 'word': 'Paris', 'start': 34, 'end': 39},
-                {'entity': 'I-LOC', 'score': 0.9982321858406067, 'index': 12, 'word': 'New', 'start': 44, 'end': 47},
-                {'entity': 'I-LOC', 'score': 0.9975290894508362, 'index': 13, 'word': 'York', 'start': 48, 'end': 52}]
-        ]
-    }
-
-@pytest.mark.asyncio
-async def test_text_embedding(text_embedding):
-    def cosine_similarity(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
-        if len(a.shape) == 1:
-            a = a.unsqueeze(0)
-
-        if len(b.shape) == 1:
-            b = b.unsqueeze(0)
-
-        a_norm = F.normalize(a, p=2, dim=1)
-        b_norm = F.normalize(b, p=2, dim=1)
-        return torch.mm(a_norm, b_norm.transpose(0, 1))
+    assert response == {"predictions": _EXPECTED_NER["predictions"][:n_copies]}
 
-    requests = ["I'm happy", "I'm full of happiness", "They were born in the capital city of France, Paris"]
-    response = await text_embedding({"instances": requests}, headers={})
-    predictions = response["predictions"]
-
-    print(cosine_similarity(torch.tensor(predictions[0]), torch.tensor(predictions[1]))[0])
-    print(cosine_similarity(torch.tensor(predictions[0]), torch.tensor(predictions[2]))[0])
-    assert cosine_similarity(torch.tensor(predictions[0]), torch.tensor(predictions[1]))[0] > 0.9
-    assert cosine_similarity(torch.tensor(predictions[0]), torch.tensor(predictions[2]))[0] < 0.6
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="bigscience/bloom-560m")
 async def test_bloom_completion(bloom_model: HuggingfaceGenerativeModel):
-    params = CreateCompletionRequest(
-        model="bloom-560m",
-        prompt="Hello, my dog is cute",
-        stream=False,
-        echo=True,
-    )
+    params = _BLOOM_REQ_BASE.model_copy()
     request = CompletionRequest(params=params, context={})
     response = await bloom_model.create_completion(request)
     assert (
@@ -413,14 +506,10 @@ async def test_bloom_completion(bloom_model: HuggingfaceGenerativeModel):
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="bigscience/bloom-560m")
 async def test_bloom_completion_max_tokens(bloom_model: HuggingfaceGenerativeModel):
-    params = CreateCompletionRequest(
-        model="bloom-560m",
-        prompt="Hello, my dog is cute",
-        stream=False,
-        echo=True,
-        max_tokens=100,  # bloom doesn't have any field specifying context length. Our implementation would default to 2048. Testing with something longer than HF's default max_length of 20
-    )
+    # bloom doesn't have any field specifying context length. Our implementation would default to 2048. Testing with something longer than HF's default max_length of 20
+    params = _BLOOM_REQ_BASE.model_copy(update={"max_tokens": 100})
     request = CompletionRequest(params=params, context={})
     response = await bloom_model.create_completion(request)
     assert (
@@ -430,39 +519,22 @@ async def test_bloom_completion_max_tokens(bloom_model: HuggingfaceGenerativeMod
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="bigscience/bloom-560m")
 async def test_bloom_completion_streaming(bloom_model: HuggingfaceGenerativeModel):
-    params = CreateCompletionRequest(
-        model="bloom-560m",
-        prompt="Hello, my dog is cute",
-        stream=True,
-        echo=False,
-    )
+    params = _BLOOM_REQ_BASE.model_copy(update={"stream": True, "echo": False})
     request = CompletionRequest(params=params, context={})
     response = await bloom_model.create_completion(request)
-    output = ""
+    chunks = []
     async for chunk in response:
-        output += chunk.choices[0].text
+        chunks.append(chunk.choices[0].text)
+    output = "".join(chunks)
     assert output == ".\n- Hey, my dog is cute.\n- Hey, my dog is cute"
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="bigscience/bloom-560m")
 async def test_bloom_chat_completion(bloom_model: HuggingfaceGenerativeModel):
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a friendly chatbot who always responds in the style of a pirate",
-        },
-        {
-            "role": "user",
-            "content": "How many helicopters can a human eat in one sitting?",
-        },
-    ]
-    params = CreateChatCompletionRequest(
-        model="bloom-560m",
-        messages=messages,
-        stream=False,
-        max_tokens=20,
-    )
+    params = _BLOOM_CHAT_REQ_BASE.model_copy()
     request = ChatCompletionRequest(params=params, context={})
     response = await bloom_model.create_chat_completion(request)
     assert (
@@ -473,28 +545,15 @@ async def test_bloom_chat_completion(bloom_model: HuggingfaceGenerativeModel):
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="bigscience/bloom-560m")
 async def test_bloom_chat_completion_streaming(bloom_model: HuggingfaceGenerativeModel):
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a friendly chatbot who always responds in the style of a pirate",
-        },
-        {
-            "role": "user",
-            "content": "How many helicopters can a human eat in one sitting?",
-        },
-    ]
-    params = CreateChatCompletionRequest(
-        model="bloom-560m",
-        messages=messages,
-        stream=True,
-        max_tokens=20,
-    )
+    params = _BLOOM_CHAT_REQ_BASE.model_copy(update={"stream": True})
     request = ChatCompletionRequest(params=params, context={})
     response = await bloom_model.create_chat_completion(request)
-    output = ""
+    chunks = []
     async for chunk in response:
-        output += chunk.choices[0].delta.content
+        chunks.append(chunk.choices[0].delta.content)
+    output = "".join(chunks)
     assert (
         output
         == "The first thing you need to do is to get a good idea of what you are looking for."
@@ -502,35 +561,22 @@ async def test_bloom_chat_completion_streaming(bloom_model: HuggingfaceGenerativ
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="mixedbread-ai/mxbai-embed-large-v1")
 async def test_text_embedding(text_embedding):
-    def cosine_similarity(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
-        if len(a.shape) == 1:
-            a = a.unsqueeze(0)
-
-        if len(b.shape) == 1:
-            b = b.unsqueeze(0)
-
-        a_norm = F.normalize(a, p=2, dim=1)
-        b_norm = F.normalize(b, p=2, dim=1)
-        return torch.mm(a_norm, b_norm.transpose(0, 1))
-
     requests = ["I'm happy", "I'm full of happiness", "They were at the park."]
     response = await text_embedding({"instances": requests}, headers={})
-    predictions = response["predictions"]
+    predictions = torch.as_tensor(response["predictions"])
 
+    # Similarity of the first request against the other two in a single call
+    similarities = F.cosine_similarity(predictions[0:1], predictions[1:])
     # The first two requests are semantically similar, so the cosine similarity should be high
-    assert (
-        cosine_similarity(torch.tensor(predictions[0]), torch.tensor(predictions[1]))[0]
-        > 0.9
-    )
+    assert similarities[0] > 0.9
     # The third request is semantically different, so the cosine similarity should be low
-    assert (
-        cosine_similarity(torch.tensor(predictions[0]), torch.tensor(predictions[2]))[0]
-        < 0.55
-    )
+    assert similarities[1] < 0.55
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="textattack/bert-base-uncased-yelp-polarity")
 async def test_input_padding(bert_base_yelp_polarity: HuggingfaceEncoderModel):
     # inputs with different lengths will throw an error
     # unless we set padding=True in the tokenizer
@@ -542,40 +588,86 @@ async def test_input_padding(bert_base_yelp_polarity: HuggingfaceEncoderModel):
     assert response == {
         "predictions": [
             {
-                'confidence': 0.9988189339637756,
+                'confidence': approx(0.9988189339637756, abs=_PROB_ABS_TOL),
                 'label': "LABEL_1",
                 'probabilities': [
-                    {'label': "LABEL_0", 'probability': approx(0.001181067)},
-                    {'label': "LABEL_1", 'probability': approx(0.998818933)}
+                    {'label': "LABEL_0", 'probability': approx(0.001181067, abs=_PROB_ABS_TOL)},
+                    {'label': "LABEL_1", 'probability': approx(0.998818933, abs=_PROB_ABS_TOL)}
                 ]
             },
             {
-                'confidence': 0.9963782429695129,
+                'confidence': approx(0.9963782429695129, abs=_PROB_ABS_TOL),
                 'label': "LABEL_1",
                 'probabilities': [
-                    {'label': "LABEL_0", 'probability': approx(0.00362180)},
-                    {'label': "LABEL_1", 'probability': approx(0.99637824)}
+                    {'label': "LABEL_0", 'probability': approx(0.00362180, abs=_PROB_ABS_TOL)},
+                    {'label': "LABEL_1", 'probability': approx(0.99637824, abs=_PROB_ABS_TOL)}
                 ]
             }
         ]
     }
 
 
+
+@pytest.mark.asyncio
+@pytest.mark.xdist_group(name="textattack/bert-base-uncased-yelp-polarity")
+async def test_mixed_duplicate_instances(
+    bert_base_yelp_polarity: HuggingfaceEncoderModel,
+):
+    # Only the repeated instance is deduplicated, and every prediction must
+    # still land at the position of its own instance.
+    request_one = "Hello, my dog is cute."
+    request_two = "Hello there, my dog is cute."
+    response = await bert_base_yelp_polarity(
+        {"instances": [request_one, request_two, request_one]}, headers={}
+    )
+    predictions = response["predictions"]
+    assert len(predictions) == 3
+    assert predictions[0] == predictions[2]
+    assert predictions[1] != predictions[0]
+    assert predictions[0]["confidence"] == approx(0.9988189339637756, abs=_PROB_ABS_TOL)
+    assert predictions[1]["confidence"] == approx(0.9963782429695129, abs=_PROB_ABS_TOL)
+
+
+@pytest.mark.asyncio
+@pytest.mark.xdist_group(name="textattack/bert-base-uncased-yelp-polarity")
+async def test_duplicate_instances_without_dedup(
+    bert_base_yelp_polarity: HuggingfaceEncoderModel,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(bert_base_yelp_polarity, "dedup_identical_instances", False)
+    request_one = "Hello, my dog is cute."
+    request_two = "Hello there, my dog is cute."
+    payload = {"instances": [request_one, request_two, request_one]}
+    context = {}
+    bert_base_yelp_polarity.preprocess(payload, context)
+    assert "inverse_indices" not in context
+
+    response = await bert_base_yelp_polarity(payload, headers={})
+    predictions = response["predictions"]
+    assert len(predictions) == 3
+    assert [prediction["label"] for prediction in predictions] == ["LABEL_1"] * 3
+    assert predictions[0]["confidence"] == approx(0.9988189339637756, abs=_PROB_ABS_TOL)
+    assert predictions[1]["confidence"] == approx(0.9963782429695129, abs=_PROB_ABS_TOL)
+    assert predictions[2]["confidence"] == approx(0.9988189339637756, abs=_PROB_ABS_TOL)
+
+
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="textattack/bert-base-uncased-yelp-polarity")
 async def test_input_truncation(bert_base_yelp_polarity: HuggingfaceEncoderModel):
     # bert-base-uncased has a max length of 512 (tokenizer.model_max_length).
     # this request exceeds that, so it will throw an error
     # unless we set truncation=True in the tokenizer
     request = "good " * 600
+    assert bert_base_yelp_polarity._tokenizer.is_fast
     response = await bert_base_yelp_polarity({"instances": [request]}, headers={})
     assert response == {
         "predictions": [
             {
-                'confidence': approx(0.7674337),
+                'confidence': approx(0.7674337, abs=_PROB_ABS_TOL),
                 'label': "LABEL_1", 
                 'probabilities': [
-                    {'label': "LABEL_0", 'probability': approx(0.2325663)}, 
-                    {'label': "LABEL_1", 'probability': approx(0.7674337)}
+                    {'label': "LABEL_0", 'probability': approx(0.2325663, abs=_PROB_ABS_TOL)}, 
+                    {'label': "LABEL_1", 'probability': approx(0.7674337, abs=_PROB_ABS_TOL)}
                 ]
             }
         ]
@@ -583,6 +675,7 @@ async def test_input_truncation(bert_base_yelp_polarity: HuggingfaceEncoderModel
 
 
 @pytest.mark.asyncio
+@pytest.mark.xdist_group(name="openai-community/openai-gpt")
 async def test_input_padding_with_pad_token_not_specified(
     openai_gpt_model: HuggingfaceGenerativeModel,
 ):
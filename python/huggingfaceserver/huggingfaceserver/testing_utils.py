@@ -0,0 +1,157 @@
+# Copyright 2024 The KServe Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pathlib
+from types import SimpleNamespace
+
+import pytest
+import torch
+import torch.nn.functional as F
+from transformers import TensorType
+
+from .encoder_model import HuggingfaceEncoderModel
+from .task import MLTask
+
+# Dynamic INT8 quantization of the Linear layers speeds up CPU inference on
+# VNNI capable hosts, at the cost of slightly perturbed scores. Opt in with
+# KSERVE_TEST_INT8=true.
+_QUANTIZE_INT8 = (
+    not torch.cuda.is_available()
+    and os.getenv("KSERVE_TEST_INT8", "false").lower() == "true"
+)
+# Trace the encoders with torch.jit at a fixed set of sequence lengths, padding
+# each batch up to the nearest bucket. Opt in with KSERVE_TEST_JIT_TRACE=true.
+_JIT_TRACE = os.getenv("KSERVE_TEST_JIT_TRACE", "false").lower() == "true"
+_TRACE_BUCKETS = (32, 64, 128, 256, 512)
+# Run the CPU encoder fixtures on ONNX Runtime through optimum, exporting each
+# model once to _ORT_CACHE_DIR. Opt in with KSERVE_TEST_ORT=true.
+_USE_ORT = (
+    not torch.cuda.is_available()
+    and os.getenv("KSERVE_TEST_ORT", "false").lower() == "true"
+)
+_ORT_CACHE_DIR = pathlib.Path.home() / ".cache" / "kserve_test" / "onnx"
+_ORT_MODEL_CLASSES = {
+    MLTask.sequence_classification: "ORTModelForSequenceClassification",
+    MLTask.fill_mask: "ORTModelForMaskedLM",
+    MLTask.token_classification: "ORTModelForTokenClassification",
+    MLTask.text_embedding: "ORTModelForFeatureExtraction",
+}
+
+
+class _BucketedTracedEncoder(torch.nn.Module):
+    """
+    Runs an encoder through modules traced at fixed sequence lengths. Each batch
+    is padded to the smallest bucket that fits it, so variable length inputs do
+    not need a trace of their own. Longer inputs fall back to the eager module.
+    """
+
+    def __init__(self, model: HuggingfaceEncoderModel):
+        super().__init__()
+        self.module = model._model
+        self.pad_token_id = model._tokenizer.pad_token_id
+        self.traced = {}
+        for length in _TRACE_BUCKETS:
+            if length > model.max_length:
+                break
+            example = model._tokenizer(
+                ["dummy"] * 2,
+                padding="max_length",
+                max_length=length,
+                return_tensors=TensorType.PYTORCH,
+                return_token_type_ids=model.return_token_type_ids,
+            ).to(model._device)
+            with torch.no_grad():
+                self.traced[length] = torch.jit.trace(
+                    self.module, example_kwarg_inputs=dict(example), strict=False
+                )
+
+    def forward(self, **inputs):
+        seq_len = inputs["input_ids"].shape[-1]
+        bucket = next((b for b in self.traced if b >= seq_len), None)
+        if bucket is None:
+            return self.module(**inputs)
+        padded = {
+            key: F.pad(
+                value,
+                (0, bucket - seq_len),
+                value=self.pad_token_id if key == "input_ids" else 0,
+            )
+            for key, value in inputs.items()
+        }
+        # The profiling executor re-optimizes traced graphs over the first calls,
+        # which costs far more than it saves for a handful of forward passes.
+        with torch.jit.optimized_execution(False):
+            outputs = self.traced[bucket](**padded)
+        # Drop the bucket padding from per token outputs.
+        return SimpleNamespace(
+            **{
+                key: value[:, :seq_len] if value.dim() == 3 else value
+                for key, value in outputs.items()
+            }
+        )
+
+
+def _load_ort_model(model: HuggingfaceEncoderModel):
+    onnxruntime = pytest.importorskip("optimum.onnxruntime")
+    ort_model_cls = getattr(onnxruntime, _ORT_MODEL_CLASSES[model.task])
+    # Key the export on the revision too, so pinning a different revision
+    # never reuses a stale export.
+    export_dir = (
+        _ORT_CACHE_DIR / str(model.model_id_or_path) / (model.model_revision or "main")
+    )
+    if export_dir.exists():
+        return ort_model_cls.from_pretrained(export_dir)
+    ort_model = ort_model_cls.from_pretrained(
+        model.model_id_or_path, revision=model.model_revision, export=True
+    )
+    ort_model.save_pretrained(export_dir)
+    return ort_model
+
+
+def _optimize_encoder(model: HuggingfaceEncoderModel) -> HuggingfaceEncoderModel:
+    if _USE_ORT:
+        model._model = _load_ort_model(model)
+        if model.nlp is not None:
+            model.nlp.model = model._model
+        return model
+    if _QUANTIZE_INT8:
+        model._model = torch.ao.quantization.quantize_dynamic(
+            model._model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        if model.nlp is not None:
+            model.nlp.model = model._model
+    # The token classification pipeline expects the model's own output
+    # type, so only the directly called encoders are traced.
+    if _JIT_TRACE and model.nlp is None:
+        model._model = _BucketedTracedEncoder(model)
+        return model
+    # "reduce-overhead" relies on CUDA graphs; on CPU the compilation time
+    # outweighs the handful of forward passes each fixture serves.
+    if not torch.cuda.is_available():
+        return model
+    # Requests are padded to their own longest instance, so mark the shapes
+    # dynamic instead of recompiling for every new sequence length.
+    model._model = torch.compile(
+        model._model, mode="reduce-overhead", fullgraph=False, dynamic=True
+    )
+    if model.nlp is not None:
+        model.nlp.model = model._model
+    # Warm up at the batch sizes the tests use, tokenized the same way as
+    # real requests, so the first test does not pay for the compilation.
+    with torch.inference_mode():
+        for batch_size in (1, 2):
+            warmup = model._tokenize(["warmup"] * batch_size, TensorType.PYTORCH)
+            model._model(**warmup.to(model._device))
+    return model
@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+
 import torch
-from transformers import PretrainedConfig
+from transformers import AutoTokenizer, PretrainedConfig, PreTrainedTokenizerBase
 from typing import Optional
 from kserve.logging import logger
 
@@ -138,3 +140,16 @@ def _mean_pooling(token_embeddings, attention_mask):
     return torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(
         input_mask_expanded.sum(1), min=1e-9
     )
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_tokenizer(
+    model_id_or_path: str, revision: Optional[str], **kwargs
+) -> PreTrainedTokenizerBase:
+    """
+    Load a tokenizer, reusing the instance for identical arguments so that models
+    sharing a tokenizer only read its vocabulary once.
+
+    The returned tokenizer is shared and must not be modified in place.
+    """
+    return AutoTokenizer.from_pretrained(model_id_or_path, revision=revision, **kwargs)